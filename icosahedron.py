@@ -3,16 +3,16 @@ Generating icosahedrons and performing transformations on them.
 """
 
 import numpy as np
-import open3d as o3d
 
 from transformations import *
 from render import *
 
-def generate_icosahedron_vertices(radius):
+def generate_icosahedron_vertices(radius, dtype=np.float32):
     # The golden ratio
     phi = (1 + np.sqrt(5)) / 2
 
-    # Define the 12 vertices of an icosahedron
+    # Define the 12 vertices of an icosahedron, float32 by default, which every transformation keeps,
+    # halving the memory each subdivision pass has to move
     vertices = np.array([
         [-1,  phi, 0],
         [ 1,  phi, 0],
@@ -27,7 +27,7 @@ def generate_icosahedron_vertices(radius):
         [-phi, 0, -1],
         [-phi, 0,  1]
     ])
-    vertices *= radius
+    vertices = np.multiply(vertices, radius, dtype=dtype)
 
     # Define the 20 triangular faces of the icosahedron using vertex indices
     faces = np.array([
@@ -37,15 +37,12 @@ def generate_icosahedron_vertices(radius):
         [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1]
     ])
 
-    # Collect all edges from the faces
-    edges = set()
-    for face in faces:
-        edges.add(tuple(sorted([face[0], face[1]])))
-        edges.add(tuple(sorted([face[1], face[2]])))
-        edges.add(tuple(sorted([face[2], face[0]])))
+    # Collect all edges from the faces, each as a sorted vertex pair
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    edges = np.column_stack((edges.min(axis=1), edges.max(axis=1)))
 
-    # Convert the set to a sorted list of edges
-    edges = np.array(sorted(edges))
+    # Drop the duplicates shared by neighbouring faces, leaving a sorted list of edges
+    edges = np.unique(edges, axis=0)
 
     return {"vertices": vertices, "edges": edges, "faces": faces, "radius": radius}
 
@@ -61,7 +58,7 @@ def main():
 
     # icosahedron = geodesic_subdivision(icosahedron["vertices"], icosahedron["edges"], icosahedron["faces"])
 
-    icosahedron["vertices"] = project_sphere(icosahedron["vertices"], radius=10.0)
+    project_sphere(icosahedron["vertices"], radius=10.0, out=icosahedron["vertices"])
 
     # render_polyhedron_3(icosahedron["vertices"], icosahedron["edges"], icosahedron["faces"])
 
@@ -73,11 +70,11 @@ def main():
 
     # render_polyhedron_3(icosahedron["vertices"], icosahedron["edges"], icosahedron["faces"])
 
-    # icosahedron = face_extrusion(icosahedron["vertices"], icosahedron["edges"], icosahedron["faces"], lambda x: (1.5, 0.75) if len(x) == 5 else (2, 0.8))
+    # icosahedron = face_extrusion(icosahedron["vertices"], icosahedron["edges"], icosahedron["faces"], {5: (1.5, 0.75), 6: (2, 0.8)})
     
-    icosahedron["vertices"] = project_sphere(icosahedron["vertices"], radius=10.0)
+    project_sphere(icosahedron["vertices"], radius=10.0, out=icosahedron["vertices"])
 
-    icosahedron = face_extrusion(icosahedron["vertices"], icosahedron["edges"], icosahedron["faces"], lambda x: (0.8, 0.8))
+    icosahedron = face_extrusion(icosahedron["vertices"], icosahedron["edges"], icosahedron["faces"], (0.8, 0.8))
 
     icosahedron = triangulate(icosahedron["vertices"], icosahedron["edges"], icosahedron["faces"])
 
@@ -2,15 +2,17 @@
 Rendering and user inteface for rendering polyhedrons.
 """
 
+import numpy as np
 import open3d as o3d
 import matplotlib.pyplot as plt
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
 
 def render_polyhedron(vertices, edges, faces):
     """
     Render a polyhedron with the given vertices, edges, and faces.
     """ 
     mesh = o3d.geometry.TriangleMesh()
-    mesh.vertices = o3d.utility.Vector3dVector(vertices)
+    mesh.vertices = o3d.utility.Vector3dVector(np.asarray(vertices, dtype=np.float64))
     mesh.triangles = o3d.utility.Vector3iVector(faces)
     mesh.compute_vertex_normals()
     mesh.compute_triangle_normals()
@@ -21,7 +23,7 @@ def render_polyhedron(vertices, edges, faces):
 def render_polyhedron_2(vertices, edges, faces):
     # Create an Open3D LineSet object
     line_set = o3d.geometry.LineSet()
-    line_set.points = o3d.utility.Vector3dVector(vertices)
+    line_set.points = o3d.utility.Vector3dVector(np.asarray(vertices, dtype=np.float64))
     line_set.lines = o3d.utility.Vector2iVector(edges)
 
     # Optionally, set the color of each edge
@@ -32,40 +34,86 @@ def render_polyhedron_2(vertices, edges, faces):
     o3d.visualization.draw_geometries([line_set], window_name="Icosahedron Edges", width=1000, height=1000)
 
 
-def render_polyhedron_3(vertices, edges, faces):
-    # Close previous figures to avoid conflicts
-    plt.close('all')
+class PolyViewer:
+    """
+    An Open3D window that stays open between polyhedrons, its geometries are updated in place
+    rather than rebuilt and added to a new window for every frame.
+    """
 
-    # Create an Open3D PointCloud for the vertices
-    point_cloud = o3d.geometry.PointCloud()
-    point_cloud.points = o3d.utility.Vector3dVector(vertices)
+    def __init__(self, window_name="Polyhedron"):
+        self.point_cloud = o3d.geometry.PointCloud()
+        self.mesh = o3d.geometry.TriangleMesh()
+        self.line_set = o3d.geometry.LineSet()
 
-    # Create a mesh to visualize the faces
-    mesh = o3d.geometry.TriangleMesh()
-    mesh.vertices = o3d.utility.Vector3dVector(vertices)
-    mesh.triangles = o3d.utility.Vector3iVector(faces)
-    mesh.compute_vertex_normals()
+        self.vis = o3d.visualization.Visualizer()
+        self.vis.create_window(window_name=window_name)
+        self.added = False
 
-    # Create a LineSet to visualize the edges
-    line_set = o3d.geometry.LineSet()
-    line_set.points = o3d.utility.Vector3dVector(vertices)
-    line_set.lines = o3d.utility.Vector2iVector(edges)
+    def set(self, vertices, edges, faces):
+        """
+        Show a triangulated polyhedron, replacing whichever one was shown before.
+        """
+
+        # Convert the vertices once, Open3D only takes float64 and all three geometries share the same points
+        points = o3d.utility.Vector3dVector(np.ascontiguousarray(vertices, dtype=np.float64))
+
+        self.point_cloud.points = points
+
+        self.mesh.vertices = points
+        self.mesh.triangles = o3d.utility.Vector3iVector(np.asarray(faces))
+        self.mesh.compute_vertex_normals()
+
+        # Each edge drawn once
+        edges = np.asarray(edges).reshape(-1, 2)
+        lines = np.unique(np.column_stack((edges.min(axis=1), edges.max(axis=1))), axis=0)
+        self.line_set.points = points
+        self.line_set.lines = o3d.utility.Vector2iVector(lines)
 
-    # Create a visualizer
-    vis = o3d.visualization.Visualizer()
-    vis.create_window()
+        # The first polyhedron adds the geometries and sets up the camera, later ones only update them
+        for geometry in (self.point_cloud, self.mesh, self.line_set):
+            if self.added:
+                self.vis.update_geometry(geometry)
+            else:
+                self.vis.add_geometry(geometry)
+        self.added = True
 
-    # Add geometries to the visualizer
-    vis.add_geometry(point_cloud)
-    vis.add_geometry(mesh)
-    vis.add_geometry(line_set)
+        self.vis.poll_events()
+        self.vis.update_renderer()
 
-    # Render the scene and capture the camera position
-    vis.run()
-    vis.destroy_window()
+    def run(self):
+        """
+        Hand control to the window until it is closed.
+        """
+
+        self.vis.run()
+
+    def close(self):
+        self.vis.destroy_window()
+
+
+def render_polyhedron_3(vertices, edges, faces, show_labels=False):
+    """
+    Render the vertices, faces and edges of a triangulated polyhedron in one Open3D scene,
+    optionally followed by a matplotlib view with vertex labels.
+    """
+
+    # Render the scene in a viewer of its own
+    viewer = PolyViewer()
+    viewer.set(vertices, edges, faces)
+    viewer.run()
+    viewer.close()
+
+    if not show_labels:
+        return
+
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces)
 
     # To show vertex and face labels, we'll use matplotlib for 2D annotations
 
+    # Close previous figures to avoid conflicts
+    plt.close('all')
+
     # Visualize vertices and labels using matplotlib
     fig = plt.figure()
     ax = fig.add_subplot(111, projection='3d')
@@ -77,11 +125,9 @@ def render_polyhedron_3(vertices, edges, faces):
     for i, vertex in enumerate(vertices):
         ax.text(vertex[0], vertex[1], vertex[2], f'V{i}', color='blue', fontsize=12)
 
-    # Plot the faces (as lines)
-    for face in faces:
-        # Close the loop for each face by connecting back to the first vertex
-        face_loop = np.append(face, face[0])
-        ax.plot(vertices[face_loop, 0], vertices[face_loop, 1], vertices[face_loop, 2], color='k')
+    # Plot the faces (as lines), every outline closed back to its first vertex and drawn as one collection
+    face_loops = np.concatenate((faces, faces[:, :1]), axis=1)
+    ax.add_collection3d(Line3DCollection(vertices[face_loops], colors='k'))
 
     # Show the plot with labels
-    plt.show()
\ No newline at end of file
+    plt.show()
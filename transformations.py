@@ -1,52 +1,246 @@
+from functools import lru_cache
+
 import numpy as np
 
 
+def _pack_faces(faces):
+    """
+    Packs faces as an (F, K) int array when they all have the same size, paired with None,
+    otherwise as one array of vertex indices plus the offset where each face starts.
+    """
+
+    # faces of equal size already stored as an (F, K) int array are used as they are
+    if isinstance(faces, np.ndarray) and faces.ndim == 2 and faces.dtype.kind in 'iu':
+        return faces.astype(int, copy=False), None
+
+    sizes = [len(face) for face in faces]
+    if len(set(sizes)) <= 1:
+        return np.array(faces, dtype=int).reshape(len(sizes), sizes[0] if sizes else 3), None
+
+    offsets = np.concatenate(([0], np.cumsum(sizes))).astype(int)
+    flat = np.concatenate([np.asarray(face, dtype=int) for face in faces])
+
+    return flat, offsets
+
+
+def _flatten_faces(faces):
+    """
+    Flattens a list of faces into one array of vertex indices plus the offset where each face starts.
+    """
+
+    packed, offsets = _pack_faces(faces)
+    if offsets is None:
+        return packed.reshape(-1), np.arange(len(packed) + 1) * packed.shape[1]
+
+    return packed, offsets
+
+
+def _unflatten_faces(flat, offsets):
+    """
+    Inverse of _flatten_faces, an (F, K) array when all faces have the same size, otherwise a list of arrays.
+    """
+
+    sizes = np.diff(offsets)
+
+    # no faces at all still come back as an empty array of triangles
+    if len(sizes) == 0:
+        return np.empty((0, 3), dtype=flat.dtype)
+
+    if (sizes == sizes[0]).all():
+        return flat.reshape(len(sizes), sizes[0])
+
+    return np.split(flat, offsets[1:-1])
+
+
+def _next_in_face(offsets):
+    """
+    For every position in the flattened faces, the position of the next vertex of the same face.
+    """
+
+    # each vertex connects to the next one in its face, the last one wraps back to the first
+    following = np.arange(1, offsets[-1] + 1)
+    following[offsets[1:] - 1] = offsets[:-1]
+
+    return following
+
+
+def _face_ids(offsets):
+    """
+    For every position in the flattened faces, the index of the face it belongs to.
+    """
+
+    sizes = np.diff(offsets)
+
+    return np.repeat(np.arange(len(sizes)), sizes)
+
+
+def _edge_keys(edges):
+    """
+    Packs each (a, b) vertex pair into a single int64 key, the smaller index in the high 32 bits,
+    so both directions of an edge share a key.
+    """
+
+    edges = edges.astype(np.int64)
+
+    return (np.minimum(edges[:, 0], edges[:, 1]) << 32) | np.maximum(edges[:, 0], edges[:, 1])
+
+
+def _edges_from_keys(keys):
+    """
+    Inverse of _edge_keys, unpacks int64 keys back into an (E, 2) array of vertex pairs.
+    """
+
+    return np.column_stack((keys >> 32, keys & 0xFFFFFFFF))
+
+
+def _paired_runs(keys):
+    """
+    Finds the keys that occur exactly twice, returning the positions of the first and second occurrence.
+    """
+
+    # after a stable sort, equal keys sit next to each other in their original order
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    # only runs of exactly two equal keys form a pair
+    same = sorted_keys[1:] == sorted_keys[:-1]
+    before = np.concatenate(([False], same[:-1]))
+    after = np.concatenate((same[1:], [False]))
+    shared = np.flatnonzero(same & ~before & ~after)
+
+    return order[shared], order[shared + 1]
+
+
+def _face_centroids(vertices, flat, offsets):
+    """
+    Mean vertex position of every face of the flattened faces.
+    """
+
+    sizes = np.diff(offsets)
+
+    # faces of equal size reduce over a plain (F, K, 3) view, mixed sizes need segmented sums
+    if len(sizes) and (sizes == sizes[0]).all():
+        return vertices[flat].reshape(len(sizes), sizes[0], -1).mean(axis=1)
+
+    sums = np.add.reduceat(vertices[flat], offsets[:-1], axis=0)
+
+    # divide in the precision of the sums so float32 vertices stay float32
+    return sums / sizes[:, None].astype(np.result_type(sums.dtype, np.float32))
+
+
 def dual_subdivision(vertices, edges, faces):
     """
     Converts polyhedron into its dual, center of faces become vertices.
     """
 
-    centroids = []
-
-    for face in faces:
-        centroids.append(np.mean([vertices[f] for f in face], axis=0, keepdims=False))
-        
-    edge_to_face = {}
-
-    for idx, face in enumerate(faces):
-        for i in range(len(face)):
-            edge = tuple(sorted((face[i], face[(i + 1) % len(face)])))
-            if edge in edge_to_face:
-                edge_to_face[edge].append(idx)
-            else:
-                edge_to_face[edge] = [idx]
-
-    dual_edges = []
-    for edge, face_list in edge_to_face.items():
-        if len(face_list) == 2:
-            dual_edges.append(sorted((face_list[0], face_list[1])))
-
-    dual_faces = []
-    for v_idx in range(len(vertices)):
-        adjacent_faces = [f_idx for f_idx, face in enumerate(faces) if v_idx in face]
-        new_centroid = np.mean([centroids[i] for i in adjacent_faces], axis=0, keepdims=False)
-
-        # orientation sorting
-        for i in range(1, len(adjacent_faces)):
-            for j in range(i, len(adjacent_faces)):
-                edge_condition = sorted((adjacent_faces[i-1], adjacent_faces[j])) in dual_edges
-                orientation_condition = np.dot(np.cross(centroids[adjacent_faces[i-1]] - new_centroid, centroids[adjacent_faces[j]] - new_centroid), new_centroid) > 0 
-                
-                if edge_condition and orientation_condition:
-                    adjacent_faces[i], adjacent_faces[j] = adjacent_faces[j], adjacent_faces[i]
+    vertices = np.asarray(vertices)
+    flat, offsets = _flatten_faces(faces)
+    centroids = _face_centroids(vertices, flat, offsets)
+
+    # edges shared by exactly two faces become the edges of the dual
+    face_ids = _face_ids(offsets)
+    following = _next_in_face(offsets)
+    face_edges = np.column_stack((flat, flat[following]))
+    first, second = _paired_runs(_edge_keys(face_edges))
+
+    # the stable sort puts the occurrence in the lower face first, so dual edges come out sorted
+    dual_edges = np.column_stack((face_ids[first], face_ids[second]))
+
+    # vertex -> face adjacency in CSR form: count the faces around each vertex, then list where each
+    # vertex sits in the flattened faces, which also locates its neighbours within that face. a stable
+    # sort keeps the positions of every vertex in face order
+    valence = np.bincount(flat, minlength=len(vertices))
+    vertex_offsets = np.concatenate(([0], np.cumsum(valence)))
+    vertex_corners = np.argsort(flat, kind='stable')
+    starts = vertex_offsets[:-1]
+
+    # every corner has two slots, towards the previous and the next vertex of its face. the two slots
+    # at a vertex that point along the same edge are partners, so leaving a corner through one slot and
+    # entering through its partner steps to the neighbouring face of the fan
+    preceding = np.empty_like(following)
+    preceding[following] = np.arange(len(flat))
+    neighbours = np.column_stack((flat[preceding], flat[following])).reshape(-1)
+    first, second = _paired_runs((np.repeat(flat, 2).astype(np.int64) << 32) | neighbours)
+    partner = np.full(len(neighbours), -1)
+    partner[first] = second
+    partner[second] = first
+
+    # a fan that is open at the boundary is walked from one end so it comes out as one strip: preferably
+    # from a corner whose next slot has no partner leaving through its previous slot, otherwise from one
+    # whose previous slot has none leaving through its next slot. closed fans start from their lowest face
+    vertex_ids = np.repeat(np.arange(len(vertices)), valence)
+    open_next = partner[2 * vertex_corners + 1] < 0
+    open_prev = partner[2 * vertex_corners] < 0
+    priority = np.where(open_next, 0, np.where(open_prev, 1, 2))
+    used = np.flatnonzero(valence > 0)
+    best = np.zeros(len(vertices), dtype=int)
+    best[used] = np.lexsort((np.arange(len(flat)), priority, vertex_ids))[starts[used]]
+    open_fan = np.zeros(len(vertices), dtype=bool)
+    open_fan[used] = priority[best[used]] < 2
+
+    walked = vertex_corners.copy()
+    walked[starts[used]] = vertex_corners[best[used]]
+    active = np.flatnonzero(valence > 1)
+    start_corners = vertex_corners[best[active]]
+    slots = 2 * start_corners + (priority[best[active]] == 1)
+    broken = []
+    for step in range(1, valence.max(initial=0)):
+        keep = valence[active] > step
+        active, start_corners, slots = active[keep], start_corners[keep], slots[keep]
+
+        entered = partner[slots]
+        corners = entered // 2
+        stuck = (entered < 0) | (corners == start_corners)
+        broken += [(v_idx, step) for v_idx in active[stuck].tolist()]
+
+        active, start_corners, entered, corners = active[~stuck], start_corners[~stuck], entered[~stuck], corners[~stuck]
+        walked[starts[active] + step] = corners
+        slots = entered ^ 1
+
+    # faces around a vertex that split into separate strips cannot be reached in one walk, each remaining
+    # strip is walked on its own from an open end, the same way the first one was
+    for v_idx, reached in broken:
+        fan = walked[starts[v_idx]:starts[v_idx] + reached].tolist()
+        rest = [c for c in vertex_corners[starts[v_idx]:vertex_offsets[v_idx + 1]].tolist() if c not in fan]
+        while rest:
+            corner = next((c for c in rest if partner[2 * c + 1] < 0), None)
+            if corner is None:
+                corner = next((c for c in rest if partner[2 * c] < 0), rest[0])
+            slot = 2 * corner + int(partner[2 * corner] < 0 <= partner[2 * corner + 1])
+            while corner in rest:
+                fan.append(corner)
+                rest.remove(corner)
+                entered = partner[slot]
+                corner = entered // 2
+                slot = entered ^ 1
+                if entered < 0:
                     break
-
-        dual_faces.append(adjacent_faces)
+        walked[starts[v_idx]:vertex_offsets[v_idx + 1]] = fan
+
+    dual_faces = face_ids[walked]
+
+    # orientation sorting, counter clockwise when viewed from outside, tested for every fan at once
+    fans = np.flatnonzero(valence > 1)
+    in_fan = np.repeat(valence > 1, valence)
+    fan_centroids = _face_centroids(centroids, dual_faces[in_fan], np.concatenate(([0], np.cumsum(valence[fans]))))
+    first = centroids[dual_faces[starts[fans]]] - fan_centroids
+    second = centroids[dual_faces[starts[fans] + 1]] - fan_centroids
+    flip = np.zeros(len(vertices), dtype=bool)
+    flip[fans] = np.einsum('ij,ij->i', np.cross(first, second), fan_centroids) < 0
+
+    # flipped closed fans keep their first face and reverse the rest, flipped open fans reverse as a whole
+    # so the strip stays in one piece
+    position = np.arange(len(flat)) - np.repeat(starts, valence)
+    shift = np.repeat(open_fan, valence)
+    reverse = np.repeat(flip, valence) & ((position > 0) | shift)
+    source = np.arange(len(flat))
+    source[reverse] = np.repeat(vertex_offsets[1:], valence)[reverse] - position[reverse] - shift[reverse]
+    dual_faces = dual_faces[source]
 
     return {
-        "vertices": np.array(centroids),
-        "edges": np.array(dual_edges),
-        "faces": np.array(dual_faces)
+        "vertices": centroids,
+        "edges": dual_edges,
+        "faces": _unflatten_faces(dual_faces, vertex_offsets)
     }
     
 
@@ -55,81 +249,151 @@ def triangulate(vertices, edges, faces):
     Converts all non triangular faces into triangles.
     """
 
-    new_vertices = []
-    new_faces = []
-    new_edges = []
-
-    for face in faces:
-        if len(face) > 3:
-            centroid = np.mean([vertices[f] for f in face], axis=0, keepdims=False)
-            new_vertices.append(centroid)
-            centroid_idx = len(vertices) + len(new_vertices) - 1
-            for i in range(len(face)):
-                new_edges.append([face[i], centroid_idx])
-                new_faces.append([face[i], face[(i + 1) % len(face)], centroid_idx])
-        else:
-            new_faces.append(face)
+    vertices = np.asarray(vertices)
+    edges = np.asarray(edges, dtype=int).reshape(-1, 2)
+    num_vertices = len(vertices)
+    num_edges = len(edges)
+
+    flat, offsets = _flatten_faces(faces)
+    sizes = np.diff(offsets)
+    face_ids = _face_ids(offsets)
+    following = _next_in_face(offsets)
+
+    if (sizes < 3).any():
+        raise ValueError("Cannot triangulate face %d, it has fewer than 3 vertices." % np.argmax(sizes < 3))
+
+    # a face with k > 3 vertices gains its centroid, k edges to it and k triangles in place of itself
+    split = sizes > 3
+    spokes = np.repeat(split, sizes)
+    centroids = _face_centroids(vertices, flat[spokes], np.concatenate(([0], np.cumsum(sizes[split]))))
+    centroid_idx = num_vertices + np.cumsum(split) - 1
+
+    # integer vertices are promoted to float so the centroids are not truncated
+    new_vertices = np.empty((num_vertices + len(centroids), 3), dtype=np.result_type(vertices.dtype, np.float32))
+    new_vertices[:num_vertices] = vertices
+    new_vertices[num_vertices:] = centroids
+
+    new_edges = np.empty((num_edges + spokes.sum(), 2), dtype=int)
+    new_edges[:num_edges] = edges
+    new_edges[num_edges:, 0] = flat[spokes]
+    new_edges[num_edges:, 1] = centroid_idx[face_ids[spokes]]
+
+    # triangles keep their place in the face list, split faces expand into their fans in place
+    face_offsets = np.concatenate(([0], np.cumsum(np.where(split, sizes, 1))))
+    new_faces = np.empty((face_offsets[-1], 3), dtype=int)
+    kept = np.flatnonzero(sizes == 3)
+    new_faces[face_offsets[kept]] = flat[offsets[kept, None] + np.arange(3)]
+    rows = face_offsets[face_ids[spokes]] + np.flatnonzero(spokes) - offsets[face_ids[spokes]]
+    new_faces[rows, 0] = flat[spokes]
+    new_faces[rows, 1] = flat[following[spokes]]
+    new_faces[rows, 2] = centroid_idx[face_ids[spokes]]
 
     return {
-        "vertices": np.vstack((np.array(vertices), np.array(new_vertices))), 
-        "edges": np.vstack((np.array(edges), np.array(new_edges))), 
-        "faces": np.array(new_faces)
+        "vertices": new_vertices, 
+        "edges": new_edges, 
+        "faces": new_faces
     }
 
 
+@lru_cache(maxsize=1)
+def _geodesic_topology(num_vertices, face_bytes):
+    """
+    Topology of a geodesic subdivision of an (F, 3) triangle array, independent of vertex positions:
+    the vertex pair each midpoint is averaged from, and the new edges and faces.
+    """
+
+    faces = np.frombuffer(face_bytes, dtype=int).reshape(-1, 3)
+
+    # edges (0, 1), (1, 2), (2, 0) of every face, shared edges collapse to one midpoint
+    face_edges = faces[:, [[0, 1], [1, 2], [2, 0]]].reshape(-1, 2)
+    unique_keys, inverse = np.unique(_edge_keys(face_edges), return_inverse=True)
+    unique_edges = _edges_from_keys(unique_keys)
+    mid_idx = np.arange(len(unique_edges)) + num_vertices
+    m = inverse.reshape(-1, 3) + num_vertices
+
+    # columns 0-2 are the corners of each face and 3-5 its midpoints, gathered into the 4 child faces
+    corners = np.concatenate((faces, m), axis=1)
+    new_faces = corners[:, [[3, 4, 5], [0, 3, 5], [1, 4, 3], [2, 5, 4]]].reshape(-1, 3)
+
+    # each original edge splits in two, plus the three inner edges of every face
+    num_edges = len(unique_edges)
+    new_edges = np.empty((2 * num_edges + 3 * len(faces), 2), dtype=int)
+    new_edges[:num_edges, 0] = unique_edges[:, 0]
+    new_edges[:num_edges, 1] = mid_idx
+    new_edges[num_edges:2 * num_edges, 0] = unique_edges[:, 1]
+    new_edges[num_edges:2 * num_edges, 1] = mid_idx
+    inner_pairs = m[:, [[0, 1], [1, 2], [2, 0]]].reshape(-1, 2)
+    np.minimum(inner_pairs[:, 0], inner_pairs[:, 1], out=new_edges[2 * num_edges:, 0])
+    np.maximum(inner_pairs[:, 0], inner_pairs[:, 1], out=new_edges[2 * num_edges:, 1])
+
+    return unique_edges, new_edges, new_faces
+
+
 def geodesic_subdivision(vertices, edges, faces):
     """
     Divides all triangular faces into 4 subfaces by connecting the midpoints of each edge.
+
+    The new topology only depends on the faces, so subdividing a moved copy of the same mesh again reuses it.
+    Only the most recent topology is kept, _geodesic_topology.cache_clear() releases it.
     """
-    
-    new_vertices = []
-    new_edges = []
-    new_faces = []
-
-    num_faces = len(faces)
-    for i in range(num_faces):
-        face = faces[i]
-        if len(face) == 3: # triangular face
-            mid_points = []
-
-            for i in range(len(face)):
-                edge = (face[i], face[(i+1)%3])
-
-                mp = tuple((vertices[edge[0]] + vertices[edge[1]])/2.0)
-                if mp in new_vertices:
-                    mid_points.append(len(vertices) + new_vertices.index(mp))
-                else:
-                    new_vertices.append(mp)
-                    mid_points.append(len(vertices) + len(new_vertices) - 1)
-
-                new_edges.append([edge[0], mid_points[-1]])
-                new_edges.append([edge[1], mid_points[-1]])
-            
-            new_edges.append(sorted([mid_points[0], mid_points[1]]))
-            new_edges.append(sorted([mid_points[1], mid_points[2]]))
-            new_edges.append(sorted([mid_points[2], mid_points[0]]))
 
-            new_faces.append((mid_points[0], mid_points[1], mid_points[2]))
-            new_faces.append((face[0], mid_points[0], mid_points[2]))
-            new_faces.append((face[1], mid_points[1], mid_points[0]))
-            new_faces.append((face[2], mid_points[2], mid_points[1]))
+    vertices = np.asarray(vertices)
+    num_vertices = len(vertices)
 
+    # only triangular faces are subdivided, any others are dropped
+    faces, offsets = _pack_faces(faces)
+    if offsets is not None:
+        sizes = np.diff(offsets)
+        faces = faces[np.repeat(sizes == 3, sizes)].reshape(-1, 3)
+    elif faces.shape[1] != 3:
+        faces = np.empty((0, 3), dtype=int)
+
+    unique_edges, new_edges, new_faces = _geodesic_topology(num_vertices, np.ascontiguousarray(faces).tobytes())
+
+    # midpoints are written straight after the original vertices in the output buffer, which is float
+    # even for integer vertices
+    new_vertices = np.empty((num_vertices + len(unique_edges), 3), dtype=np.result_type(vertices.dtype, np.float32))
+    new_vertices[:num_vertices] = vertices
+    mid_points = new_vertices[num_vertices:]
+    np.add(vertices[unique_edges[:, 0]], vertices[unique_edges[:, 1]], out=mid_points)
+    mid_points *= 0.5
+
+    # the cached topology is shared between calls, so callers get their own copies
     return {
-        "vertices": np.vstack((vertices, np.array(new_vertices))), 
-        "edges": np.array(new_edges), 
-        "faces": np.array(new_faces)
+        "vertices": new_vertices, 
+        "edges": new_edges.copy(), 
+        "faces": new_faces.copy()
     }
             
 
-def project_sphere(vertices, radius=1.0):
+def project_sphere(vertices, radius=1.0, out=None):
     """
     Projects the vertices onto a unit sphere centered at origin.
+
+    The result is written into out when given, which may be vertices itself to project in place.
+    Integer vertices are projected to floats, so out must have a float dtype.
     """
     
-    v = vertices / np.linalg.norm(vertices, axis=1, keepdims=True)
-    v *= radius
+    if out is not None and out.dtype.kind != 'f':
+        raise TypeError("Cannot write projected vertices into an array of dtype %s." % out.dtype)
+
+    # integer vertices are promoted to float, float32 and float64 are kept as they are
+    vertices = np.asarray(vertices)
+    vertices = vertices.astype(np.result_type(vertices.dtype, np.float32), copy=False)
 
-    return v
+    # squared norms in one pass, then turned into per-vertex scales in place
+    scale = np.einsum('ij,ij->i', vertices, vertices)
+    np.sqrt(scale, out=scale)
+
+    if (scale == 0).any():
+        raise ValueError("Cannot project a vertex at the origin onto a sphere.")
+
+    if radius == 1.0:
+        np.reciprocal(scale, out=scale)
+    else:
+        np.divide(radius, scale, out=scale)
+
+    return np.multiply(vertices, scale[:, None], out=out)
 
 
 def face_extrusion(vertices, edges, faces, ext_fn):
@@ -137,49 +401,145 @@ def face_extrusion(vertices, edges, faces, ext_fn):
     Generates extrusions on each of the faces according to an extrusion function:
 
     An extrusion function takes the vertices of a face and determines the extrusion length and percentage.
+    A constant (length, percentage) tuple can be passed instead to extrude every face the same way,
+    or a dict mapping a face size to its (length, percentage).
 
     """
 
-    new_vertices = []
-    new_edges = []
-    new_faces = []
-
-
-    for face in faces:
-        ext_len, ext_pct = ext_fn(face)
-
-        centroid = np.mean([vertices[f] for f in face], axis=0, keepdims=False)
-        centroid = centroid*ext_len
-        
-
-        if ext_pct == 1.0:
-            new_vertices.append(centroid)
-            for i in range(len(faces)):
-                new_edges.append((faces[i], len(vertices) + len(new_vertices) - 1))
-                
-                if i != 0:
-                    new_faces.append([faces[i-1], faces[i], len(vertices)+len(new_vertices)-1])
-        else:
-            for i in range(len(face)):
-                v_coords = vertices[face[i]]
-                new_vertices.append(v_coords + (centroid - v_coords)*ext_pct)
-                new_edges.append((face[i], len(vertices) + len(new_vertices) - 1))
-                
-                if i == len(face)-1:
-                    new_edges.append((len(vertices) + len(new_vertices) - len(face), len(vertices) + len(new_vertices) - 1))
-                    new_faces.append([face[i], face[i-len(face)+1], len(vertices)+len(new_vertices)-len(face), len(vertices)+len(new_vertices)-1])
-                if i != 0:
-                    new_edges.append((len(vertices) + len(new_vertices) - 2, len(vertices) + len(new_vertices) - 1))
-                    new_faces.append([face[i-1], face[i], len(vertices)+len(new_vertices)-1, len(vertices)+len(new_vertices)-2])
-
-            new_faces.append([len(vertices)+len(new_vertices)-i for i in range(len(face), 0, -1)])
-                    
+    vertices = np.asarray(vertices)
+    num_vertices = len(vertices)
+
+    flat, offsets = _flatten_faces(faces)
+    sizes = np.diff(offsets)
+
+    # extrusion parameters and new vertices share the precision of the vertices, integers become float
+    dtype = np.result_type(vertices.dtype, np.float32)
+
+    if callable(ext_fn):
+        # the extrusion function is arbitrary Python, so it is called once per face up front
+        ext_len, ext_pct = np.array([ext_fn(face) for face in faces], dtype=dtype).reshape(-1, 2).T
+    elif isinstance(ext_fn, dict):
+        # extrusions keyed by face size are looked up once per distinct size
+        face_sizes, size_idx = np.unique(sizes, return_inverse=True)
+        table = np.array([ext_fn[k] for k in face_sizes.tolist()], dtype=dtype).reshape(-1, 2)
+        ext_len, ext_pct = table[size_idx.reshape(-1)].T
+    else:
+        # a constant extrusion is broadcast to every face without any calls
+        ext_len, ext_pct = (np.full(len(sizes), value, dtype=dtype) for value in ext_fn)
+
+    face_ids = _face_ids(offsets)
+    following = _next_in_face(offsets)
+
+    centroids = _face_centroids(vertices, flat, offsets) * ext_len[:, None]
+
+    # a full extrusion collapses the face into a single apex, otherwise every vertex gets an inner copy
+    apex = ext_pct == 1.0
+    ring = ~apex[face_ids]
+    new_sizes = np.where(apex, 1, sizes)
+    new_offsets = np.concatenate(([0], np.cumsum(new_sizes)))
+
+    # index of the new vertex that each face vertex connects to
+    inner = new_offsets[face_ids] + np.where(ring, np.arange(len(flat)) - offsets[face_ids], 0)
+
+    # new vertices and edges are written straight after the original ones in the output buffers
+    new_vertices = np.empty((num_vertices + new_offsets[-1], 3), dtype=dtype)
+    new_vertices[:num_vertices] = vertices
+    added = new_vertices[num_vertices:]
+    added[new_offsets[:-1][apex]] = centroids[apex]
+    face_coords = vertices[flat[ring]]
+    added[inner[ring]] = face_coords + (centroids[face_ids[ring]] - face_coords) * ext_pct[face_ids[ring], None]
+    inner += num_vertices
+
+    edges = np.asarray(edges, dtype=int).reshape(-1, 2)
+    ring_edges = np.column_stack((inner, inner[following]))[ring]
+    new_edges = np.empty((len(edges) + len(flat) + len(ring_edges), 2), dtype=int)
+    new_edges[:len(edges)] = edges
+    new_edges[len(edges):len(edges) + len(flat), 0] = flat
+    new_edges[len(edges):len(edges) + len(flat), 1] = inner
+    new_edges[len(edges) + len(flat):] = ring_edges
+
+    # quads between each face edge and its inner copy, triangles up to the apex, then the inner caps,
+    # each written as one slab of the flat output faces
+    sides = np.column_stack((flat, flat[following], inner[following], inner))
+    num_quads = np.count_nonzero(ring)
+    num_triangles = len(flat) - num_quads
+    quads_end = 4 * num_quads
+    triangles_end = quads_end + 3 * num_triangles
+
+    new_flat = np.empty(triangles_end + num_quads, dtype=int)
+    new_flat[:quads_end] = sides[ring].ravel()
+    new_flat[quads_end:triangles_end] = sides[~ring, :3].ravel()
+    new_flat[triangles_end:] = inner[ring]
+
+    caps_start = num_quads + num_triangles
+    new_face_offsets = np.empty(caps_start + np.count_nonzero(~apex) + 1, dtype=int)
+    new_face_offsets[:num_quads] = np.arange(num_quads) * 4
+    new_face_offsets[num_quads:caps_start] = quads_end + np.arange(num_triangles) * 3
+    new_face_offsets[caps_start] = triangles_end
+    new_face_offsets[caps_start + 1:] = triangles_end + np.cumsum(sizes[~apex])
+
     return {
-        "vertices": np.vstack((vertices, np.array(new_vertices))), 
-        "edges": np.vstack((edges, np.array(new_edges))), 
-        "faces": np.array(new_faces)
+        "vertices": new_vertices, 
+        "edges": new_edges, 
+        "faces": _unflatten_faces(new_flat, new_face_offsets)
     }
-                
 
 
-        
+def merge_close_vertices(vertices, edges, faces, tol=1e-6):
+    """
+    Merges vertices that round to the same point on a grid of spacing tol, for joining meshes built separately.
+
+    Vertices closer than tol are only merged when they round to the same grid point, two vertices just
+    either side of a cell boundary stay apart however close they are.
+    Each group of merged vertices keeps its first one, edges and faces are remapped onto the survivors,
+    edges or faces that collapse in the process are dropped, and so are duplicates, where faces count as
+    duplicates when they list the same vertices in the same cyclic order.
+    """
+
+    vertices = np.asarray(vertices)
+
+    # hash every vertex by its rounded coordinates, equal keys are one vertex
+    grid = np.round(vertices / tol).astype(np.int64)
+    _, first, inverse = np.unique(grid, axis=0, return_index=True, return_inverse=True)
+
+    # survivors keep the order in which they first appear
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    remap = rank[inverse.reshape(-1)]
+
+    edges = remap[np.asarray(edges, dtype=int).reshape(-1, 2)]
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    new_edges = _edges_from_keys(np.unique(_edge_keys(edges)))
+
+    # a face loses any vertex merged into the one before it, and disappears once fewer than three remain
+    flat, offsets = _flatten_faces(faces)
+    flat = remap[flat]
+    keep = flat != flat[_next_in_face(offsets)]
+    sizes = np.bincount(_face_ids(offsets)[keep], minlength=len(offsets) - 1)
+    flat = flat[keep & np.repeat(sizes >= 3, np.diff(offsets))]
+    sizes = sizes[sizes >= 3]
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+
+    # faces are compared rotated to start at their lowest vertex, the first of each duplicate is kept
+    face_ids = _face_ids(offsets)
+    position = np.arange(len(flat)) - offsets[face_ids]
+    lowest = np.full(len(sizes), np.iinfo(flat.dtype).max)
+    np.minimum.at(lowest, face_ids, flat)
+    shift = np.full(len(sizes), len(flat))
+    np.minimum.at(shift, face_ids, np.where(flat == lowest[face_ids], position, len(flat)))
+    rotated = flat[offsets[face_ids] + (position + shift[face_ids]) % sizes[face_ids]]
+
+    unique_faces = np.zeros(len(sizes), dtype=bool)
+    for k in np.unique(sizes).tolist():
+        same_size = np.flatnonzero(sizes == k)
+        _, first_face = np.unique(rotated[np.repeat(sizes == k, sizes)].reshape(-1, k), axis=0, return_index=True)
+        unique_faces[same_size[first_face]] = True
+    flat = flat[np.repeat(unique_faces, sizes)]
+    sizes = sizes[unique_faces]
+
+    return {
+        "vertices": vertices[first[order]],
+        "edges": new_edges,
+        "faces": _unflatten_faces(flat, np.concatenate(([0], np.cumsum(sizes))))
+    }